@@ -23,7 +23,7 @@ There are no buttons.
 
 Dependencies
 ------------
-PyMuPDF > 1.14.5, PySimpleGUI (tkinter), json
+PyMuPDF > 1.14.5, PySimpleGUI (tkinter), json, Pillow (optional), orjson (optional)
 """
 
 help_text = """Actions supported (action, key):
@@ -47,7 +47,17 @@ version = '0.001, pre alpha'
 import sys
 import fitz
 import PySimpleGUI as sg
+import tkinter as tk
 import os.path
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+try:
+    # Pillow is optional - without it pages are passed to tkinter as PPM images
+    from PIL import Image, ImageTk
+except ImportError:
+    Image = ImageTk = None
 
 print('Document-browser version: ', version)
 # print("PyMuPDF version: ", fitz.version)
@@ -57,6 +67,7 @@ print('PySimpleGUI version: ', sg.version)
 import logging
 #logging.basicConfig(filename='browser.log', level=logging.INFO)
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 from configuration import Configuration
         
@@ -120,33 +131,73 @@ class DocumentView:
     doc_page_count = page count of document
     page_index = 0 # currently viewed page index (0 based)
     zoom = scale factor – 1 is natural size (screen calibrated to physical size of document)
-    cache = dict; cache of viewed pages (as pixmaps)
+    cache = LRU cache of display lists of viewed pages
+    max_cache_pages = maximal number of display lists in cache
+    _pixmap_cache = LRU cache of rendered page pixmaps, keyed by
+                    (page_index, zoom, colorspace name), bounded by count
+                    and by memory of pixmap samples
     max_size = maximal dimensions of viewed page, tuple (width, height)
     colorspace = fitz.csRGB # colorspace of page rendering
     dpi - display dpi
     """
+
+    CACHE_MAX = 32 # default maximal number of display lists in cache
+    PIXMAP_CACHE_MAX = 16 # maximal number of pixmaps in cache (they are much bigger)
+    PIXMAP_CACHE_BYTES = 256 * 1024 * 1024 # maximal memory of pixmaps in cache (size grows with zoom²)
+    PREFETCH_DEPTH = 2 # number of pages prefetched in each direction from current page
+
+    # PyMuPDF is not thread safe - all calls into MuPDF made by the views
+    # (from main thread and from prefetching threads) are serialized
+    _lock = threading.RLock()
+
+    _SCREEN_SIZE = None # screen size, queried once for all views
+
+    RENDERED_EVENT = '-RENDERED-' # sent to window when page rendered in background is ready
     
     def __init__(self, file_name, page_index=0, max_size=None,
-                 colorspace=fitz.csRGB, zoom=1.0, dpi=94, location=(0,0)):
-        # initialize document
+                 colorspace=fitz.csRGB, zoom=1.0, dpi=94, location=(0,0),
+                 max_cache_pages=None):
         self.file_name = file_name
-        self.doc = fitz.open(file_name)
-        self.doc_page_count = len(self.doc)
-        self.cache = dict()
         self.page_index = page_index
         self.zoom = zoom
         self.colorspace = colorspace
         self.dpi=dpi
+        # correction of scale to display dpi (default for PyMuPDF 72 dpi)
+        self._dpi_correction = dpi / 72
+        self._matrix_cache = dict() # rendering matrices by zoom
+        self.cache = OrderedDict()
+        self.max_cache_pages = max_cache_pages or self.CACHE_MAX
+        self._pixmap_cache = OrderedDict()
+        self._pixmap_cache_bytes = 0 # memory of pixmap samples in cache
+        # guards pixmap cache only (held shortly, MuPDF lock is not needed
+        # to get rendered page)
+        self._cache_lock = threading.Lock()
+        self._page_sizes = dict() # page (width, height) by page index
+        self._tk_photo = None # tkinter image of displayed page
+        self._tk_photo_mode = None # image mode of `_tk_photo` ("L" or "RGB")
+        # background rendering of neighbour pages
+        self._prefetch_futures = dict()
+        self._render_future = None # background rendering of page to display
+        self._render_key = None # pixmap key of page rendered by `_render_future`
+        self._closing = False # set when view is closing, background work is dropped
+        # initialize document (opened and first page rendered in background
+        # thread while main thread queries screen size)
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        opening = self._pool.submit(self._open_document, file_name)
         # get physical screen dimension to determine the page image max size
-        # print("screen size = " sg.Window.get_screen_size())
         if not max_size:
-            w, h = sg.Window.get_screen_size()
+            if DocumentView._SCREEN_SIZE is None:
+                DocumentView._SCREEN_SIZE = sg.Window.get_screen_size()
+            w, h = DocumentView._SCREEN_SIZE
             max_width = w - 20
             max_height = h - 75
-            self.max_size = (max_width, max_height)
-        # initialize view
-        img, w, h = self.get_page_image()
-        self.image_elem= sg.Image(data=img)  # make image element
+            max_size = (max_width, max_height)
+        self.max_size = max_size
+        pixmap = opening.result()
+        # initialize view (page image is set when window is finalized,
+        # tkinter images can't be created before)
+        w, h = pixmap.width, pixmap.height
+        self.image_elem= sg.Image()  # make image element
         mw, mh = self.max_size
         w = min(w, mw)
         h = min(h, mh)
@@ -156,7 +207,8 @@ class DocumentView:
                              expand_x=True,
                              expand_y=True,
                              )],]
-        self.form = sg.Window(title=self.get_view_title(),
+        self._title = self.get_view_title() # current window title
+        self.form = sg.Window(title=self._title,
                               icon='./temp/Oxygen-Icons.org-Oxygen-Apps-graphics-viewer-document.ico',
                               layout=layout,
                               margins=(1,1), element_padding=(0,0),
@@ -167,6 +219,9 @@ class DocumentView:
                               finalize=True,
                               enable_close_attempted_event=True,
                               )
+        self._show_image(*self.get_page_image())
+        self._last_render_key = self._pixmap_key(self.page_index, self.zoom, self.colorspace)
+        self._update_pending = None # id of scheduled update (see `schedule_update`)
         self.form.TKroot.focus_force()
 
         # define keybindings not known to PySimpleGUI (key with modifier)
@@ -178,6 +233,19 @@ class DocumentView:
         self.form.bind('<KeyPress-F1>', "key-F1")
         self.form.bind('<FocusIn>','FOCUS IN')
 
+        # first page change shouldn't wait for rendering
+        self._prefetch_neighbours()
+
+    def _open_document(self, file_name):
+        """
+        Open PyMuPDF document and render its current page
+        (called from background thread). Return page pixmap.
+        """
+        with self._lock:
+            self.doc = fitz.open(file_name)
+            self.doc_page_count = len(self.doc)
+            return self._get_page_pixmap(self.page_index, self.zoom, self.colorspace)
+
     @classmethod
     def from_config(cls, config_dictionary, max_size=None):
         """
@@ -209,6 +277,8 @@ class DocumentView:
         location = self.get_location()
         if not location or not location[0] or not location[1]:
             location = (0,0)
+        # list, as loaded from json (so unchanged entry compares equal)
+        location = list(location)
         return {"file_name": self.file_name,
                 "page": self.page_index,
                 "zoom": self.zoom,
@@ -216,48 +286,246 @@ class DocumentView:
                 "location": location,
                 }
 
-    def get_display_list(self):
+    def _cache_put(self, cache, key, value, max_size):
         """
-        Return display list of current page (maybe from cache).
+        Insert value into LRU cache, evict least recently used entries
+        if cache grows over `max_size`.
         """
-        cache_key = self.page_index
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        else:
-            display_list = self.doc[self.page_index].get_displaylist()
-            self.cache[cache_key] = display_list
-            return display_list
+        cache[key] = value
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+    def get_display_list(self, page_index=None):
+        """
+        Return display list of page with given index, by default
+        current page (maybe from cache).
+        """
+        cache_key = self.page_index if page_index is None else page_index
+        with self._lock:
+            if cache_key in self.cache:
+                self.cache.move_to_end(cache_key)
+                return self.cache[cache_key]
+            else:
+                display_list = self.doc[cache_key].get_displaylist()
+                self._cache_put(self.cache, cache_key, display_list, self.max_cache_pages)
+                return display_list
         
     def get_page_image(self):
         """
-        Return a tkinter.PhotoImage for a document page index (0-based)
+        Return image of current page for tkinter as tuple (image, width, height).
+        Image is PhotoImage made directly from pixmap samples if Pillow
+        is available, from PPM data otherwise. PhotoImage of view is reused
+        (overwritten in place) while page image dimensions and mode don't
+        change (Pillow converts pasted image to mode of PhotoImage).
+        """
+        pixmap = self._get_page_pixmap(self.page_index, self.zoom, self.colorspace)
+        w, h = pixmap.width, pixmap.height
+        mode = "L" if pixmap.n == 1 else "RGB"
+        photo = self._tk_photo
+        reuse = (photo is not None and mode == self._tk_photo_mode
+                 and photo.width() == w and photo.height() == h)
+        if ImageTk:
+            # Pillow image shares memory of pixmap samples (no copy is made
+            # before tkinter gets the pixels)
+            image = Image.frombuffer(mode, (w, h),
+                                     pixmap.samples_mv, "raw", mode, pixmap.stride, 1)
+            if reuse:
+                photo.paste(image)
+            else:
+                photo = ImageTk.PhotoImage(image)
+        else:
+            # RGB (gray) samples are exactly PPM (PGM) raster, only header is needed
+            # (joined with samples memoryview - raster is copied only once)
+            magic = b"P5" if pixmap.n == 1 else b"P6"
+            data = b"".join((self._ppm_header(magic, w, h), pixmap.samples_mv))
+            if reuse:
+                photo.configure(data=data)
+            else:
+                photo = tk.PhotoImage(data=data)
+        self._tk_photo = photo # keep reference, so image is not garbage collected
+        self._tk_photo_mode = mode
+        return photo, w, h
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def _ppm_header(magic, width, height):
+        """
+        Return PPM header for image of given dimensions (maybe from cache).
+        """
+        return b"%s\n%d %d\n255\n" % (magic, width, height)
+
+    @staticmethod
+    def _pixmap_key(page_index, zoom, colorspace):
+        """
+        Return key of page pixmap in cache. Zoom is rounded, so zoom
+        returning to previous value after zoom in and out hits the cache.
+        """
+        return (page_index, round(zoom, 4), colorspace.name)
+
+    def _get_page_pixmap(self, page_index, zoom, colorspace, use_display_list=True):
+        """
+        Return pixmap of page rendered with given zoom and colorspace
+        (maybe from cache). It is called also from prefetching thread.
+        Pages rendered without `use_display_list` (pages prefetched
+        and maybe never viewed) are rendered directly from document page,
+        without building display list, if it is not already in cache.
+        """
+        cache_key = self._pixmap_key(page_index, zoom, colorspace)
+        pixmap = self._cached_pixmap(cache_key)
+        if pixmap is not None:
+            return pixmap
+        with self._lock:
+            # page could be rendered by other thread while waiting for lock
+            pixmap = self._cached_pixmap(cache_key)
+            if pixmap is not None:
+                return pixmap
+            if use_display_list or page_index in self.cache:
+                source = self.get_display_list(page_index)
+            else:
+                source = self.doc[page_index]
+            rect = source.rect
+            self._page_sizes[page_index] = (rect.width, rect.height)
+            pixmap = source.get_pixmap(matrix=self._matrix(zoom), #dpi=96,
+                                       colorspace=colorspace,
+                                       alpha=False)
+        with self._cache_lock:
+            self._pixmap_cache_put(cache_key, pixmap)
+        return pixmap
+
+    def _pixmap_cache_put(self, cache_key, pixmap):
+        """
+        Insert pixmap into cache, evict least recently used pixmaps if cache
+        grows over `PIXMAP_CACHE_MAX` pixmaps or `PIXMAP_CACHE_BYTES` of memory
+        (inserted pixmap is kept). Called with `_cache_lock` held.
+        """
+        cache = self._pixmap_cache
+        old = cache.pop(cache_key, None)
+        if old is not None:
+            self._pixmap_cache_bytes -= old.stride * old.height
+        cache[cache_key] = pixmap
+        self._pixmap_cache_bytes += pixmap.stride * pixmap.height
+        while len(cache) > 1 and (len(cache) > self.PIXMAP_CACHE_MAX
+                                  or self._pixmap_cache_bytes > self.PIXMAP_CACHE_BYTES):
+            _, evicted = cache.popitem(last=False)
+            self._pixmap_cache_bytes -= evicted.stride * evicted.height
+
+    def _cached_pixmap(self, cache_key):
+        """
+        Return pixmap from cache or None (doesn't wait for MuPDF lock).
+        """
+        with self._cache_lock:
+            pixmap = self._pixmap_cache.get(cache_key)
+            if pixmap is not None:
+                self._pixmap_cache.move_to_end(cache_key)
+            return pixmap
+
+    def _matrix(self, zoom):
+        """
+        Return rendering matrix for zoom corrected to display dpi
+        (maybe from cache).
+        """
+        matrix = self._matrix_cache.get(zoom)
+        if matrix is None:
+            if len(self._matrix_cache) >= 8:
+                self._matrix_cache.clear()
+            scale = zoom * self._dpi_correction
+            matrix = fitz.Matrix(scale, scale)
+            self._matrix_cache[zoom] = matrix
+        return matrix
+
+    def _prefetch(self, page_index):
+        """
+        Render page with given index in background thread, so it is
+        ready in cache when user goes to it.
+        """
+        cache_key = self._pixmap_key(page_index, self.zoom, self.colorspace)
+        if cache_key in self._pixmap_cache or cache_key in self._prefetch_futures:
+            return
+        future = self._pool.submit(self._get_page_pixmap,
+                                   page_index, self.zoom, self.colorspace,
+                                   use_display_list=False)
+        self._prefetch_futures[cache_key] = future
+        future.add_done_callback(lambda f: self._prefetch_futures.pop(cache_key, None))
+
+    def _request_render(self, render_key):
+        """
+        Render current page in background thread. Window gets `RENDERED_EVENT`
+        when page is ready.
+        """
+        if render_key == self._render_key and not self._render_future.done():
+            return
+        # page to display goes before prefetched pages, and rendering of page
+        # user already left is dropped (if not started yet), so held key
+        # doesn't make backlog of renders
+        if self._render_future is not None:
+            self._render_future.cancel()
+        for future in list(self._prefetch_futures.values()):
+            future.cancel()
+        self._render_key = render_key
+        self._render_future = self._pool.submit(self._render,
+                                                self.page_index, self.zoom, self.colorspace)
+
+    def _render(self, page_index, zoom, colorspace):
+        """
+        Render page to cache and notify window (called from background thread).
         """
-        display_list = self.get_display_list()
-        # correction of scale to display dpi (default for PyMuPDF 72 dpi)
-        dpi_correction = self.dpi / 72 
-        matrix = fitz.Matrix(self.zoom * dpi_correction, self.zoom * dpi_correction)
-        pixmap = display_list.get_pixmap(matrix=matrix, #dpi=96,
-                                         colorspace=self.colorspace,
-                                         alpha=False)
-        return pixmap.tobytes("ppm"), pixmap.width, pixmap.height  # make PPM image from pixmap for tkinter, requires PyMuPDF version > 1.14.5
+        try:
+            self._get_page_pixmap(page_index, zoom, colorspace)
+        except Exception:
+            if not self._closing:
+                logger.exception("Rendering of page %s failed", page_index)
+        else:
+            if not self._closing:
+                self.form.write_event_value(self.RENDERED_EVENT, page_index)
+
+    def _prefetch_neighbours(self):
+        """
+        Render next and previous pages (up to `PREFETCH_DEPTH` in each
+        direction, nearest first) in background. Pending prefetching
+        of other pages (e.g. after jump to another page) is cancelled.
+        With big zoom fewer pages are prefetched, so they fit in cache
+        together with current page (prefetched pages don't evict each other).
+        """
+        indexes = []
+        for distance in range(1, min(self.PREFETCH_DEPTH, self.doc_page_count // 2) + 1):
+            indexes.append((self.page_index + distance) % self.doc_page_count)
+            indexes.append((self.page_index - distance) % self.doc_page_count)
+        pixmap = self._cached_pixmap(self._pixmap_key(self.page_index, self.zoom, self.colorspace))
+        if pixmap is not None:
+            del indexes[max(0, self.PIXMAP_CACHE_BYTES // (pixmap.stride * pixmap.height) - 1):]
+        wanted = {self._pixmap_key(i, self.zoom, self.colorspace) for i in indexes}
+        for cache_key, future in list(self._prefetch_futures.items()):
+            if cache_key not in wanted:
+                future.cancel()
+        for page_index in indexes:
+            self._prefetch(page_index)
+
+    def get_page_size(self):
+        """
+        Return size of current page as tuple (width, height) (maybe from cache).
+        Size is stored when page is rendered, so for displayed page MuPDF
+        lock is not needed.
+        """
+        size = self._page_sizes.get(self.page_index)
+        if size is None:
+            with self._lock:
+                rect = self.doc[self.page_index].rect  # the page rectangle
+            size = (rect.width, rect.height)
+            self._page_sizes[self.page_index] = size
+        return size
 
     def get_fit_zoom(self, fit_size=None):
         """
         Return zoom that fits page to available space (self.max_size).
         """
         max_size = fit_size or self.max_size
-        rect = self.get_display_list().rect  # the page rectangle
+        width, height = self.get_page_size()
         zoom = self.zoom
         if max_size:
             max_width, max_height = max_size
-            fit_width_zoom = max_width / rect.width
-            fit_height_zoom = max_height / rect.height
-            zoom = min(1, fit_width_zoom, fit_height_zoom)
-            if zoom == 1:
-                zoom = min(fit_width_zoom, fit_height_zoom)
+            zoom = min(max_width / width, max_height / height)
         # correction of zoom to display dpi (default for PyMuPDF 72 dpi)
-        dpi_correction = self.dpi / 72 
-        zoom = zoom / dpi_correction
+        zoom = zoom / self._dpi_correction
         return zoom
 
     def set_zoom(self, zoom):
@@ -276,57 +544,104 @@ class DocumentView:
         """
         Decrement or wrap around current page index.
         """
-        previous_page = self.page_index - 1
-        if previous_page < 0:
-            previous_page += self.doc_page_count
-        self.page_index = previous_page
+        self.page_index = (self.page_index - 1) % self.doc_page_count
 
     def next_page(self):
         """
         Increment or wrap around current page index.
         """
-        next_page = self.page_index + 1
-        if next_page >= self.doc_page_count:
-            next_page -= self.doc_page_count
-        self.page_index = next_page
+        self.page_index = (self.page_index + 1) % self.doc_page_count
 
     def go_to_page(self, index):
         """
         Go to page with given index (1-based) but check if not out of bounds.
         """
-        page = index - 1
-        if page >= self.doc_page_count:
-            self.page_index = page_count - 1
-        elif page < 0:
-            self.page_index = 0
-        else:
-            self.page_index = page
+        self.page_index = max(0, min(index - 1, self.doc_page_count - 1))
 
     def toggle_colorspace(self):
         """
         Switch between Gray and RGB colorspaces.
+        Gray pixmap of current page is converted from RGB pixmap
+        if it is already in cache, instead of rendering page again.
         """
         if self.colorspace is fitz.csGRAY:
             self.colorspace = fitz.csRGB
         else:
             self.colorspace = fitz.csGRAY
+            rgb_key = self._pixmap_key(self.page_index, self.zoom, fitz.csRGB)
+            gray_key = self._pixmap_key(self.page_index, self.zoom, fitz.csGRAY)
+            rgb_pixmap = self._cached_pixmap(rgb_key)
+            if rgb_pixmap is None or gray_key in self._pixmap_cache:
+                return
+            # don't wait for background rendering, page is rendered
+            # in usual way, if MuPDF is busy
+            if not self._lock.acquire(blocking=False):
+                return
+            try:
+                gray_pixmap = fitz.Pixmap(fitz.csGRAY, rgb_pixmap)
+            finally:
+                self._lock.release()
+            with self._cache_lock:
+                self._pixmap_cache_put(gray_key, gray_pixmap)
+
+    def schedule_update(self, delay=50):
+        """
+        Update view `delay` milliseconds after last call. Pending update
+        is postponed by each call, so bursts of events (e.g. held zoom key)
+        render only final state.
+        """
+        if self._update_pending is not None:
+            self.form.TKroot.after_cancel(self._update_pending)
+        self._update_pending = self.form.TKroot.after(delay, self.update)
 
     def update(self):
+        if self._update_pending is not None:
+            self.form.TKroot.after_cancel(self._update_pending)
+            self._update_pending = None
+        # skip rendering if page image would not change
+        render_key = self._pixmap_key(self.page_index, self.zoom, self.colorspace)
+        if render_key == self._last_render_key:
+            self._update_title()
+            return
+        # if page is not rendered yet, previous page stays displayed
+        # until it is rendered in background (see `_request_render`)
+        if render_key not in self._pixmap_cache:
+            self._request_render(render_key)
+            return
         # update view
         img, w, h = self.get_page_image()
-        self.image_elem.Update(data=img)
+        self._show_image(img, w, h)
         mw, mh = self.max_size
         w = min(w, mw)
         h = min(h, mh)
         self.form.size = (w, h)
         # update form title
-        self.form.set_title(self.get_view_title())
+        self._update_title()
+        self._last_render_key = render_key
+        self._prefetch_neighbours()
+
+    def _update_title(self):
+        """
+        Set window title, if it changed (it costs window manager round trip).
+        """
+        title = self.get_view_title()
+        if title != self._title:
+            self.form.set_title(title)
+            self._title = title
+
+    def _show_image(self, image, width, height):
+        """
+        Display page image directly in tkinter widget of image element.
+        """
+        widget = self.image_elem.Widget
+        widget.configure(image=image, width=width, height=height)
+        widget.image = image # keep reference, so image is not garbage collected
 
     def get_location(self):
         try:
             loc = self.form.current_location()
-        except Exception:
-            print(Exception)
+        except Exception as e:
+            logger.debug("current_location failed: %s", e)
             loc = (0,0)
         return loc
 
@@ -337,6 +652,27 @@ class DocumentView:
         self.form.move_to_center()
 
     def close(self):
+        """
+        Close window and release document with its caches
+        (don't wait for garbage collector to free MuPDF memory).
+        Background thread is not joined - running rendering may need
+        main thread (window event), it finishes before document is closed
+        (both hold MuPDF lock) and its result is dropped.
+        """
+        self._closing = True
+        if self._render_future is not None:
+            self._render_future.cancel()
+        for future in list(self._prefetch_futures.values()):
+            future.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self.cache.clear()
+            with self._cache_lock:
+                self._pixmap_cache.clear()
+                self._pixmap_cache_bytes = 0
+            self.doc.close()
+        if self._update_pending is not None:
+            self.form.TKroot.after_cancel(self._update_pending)
         self.form.close()
 
 
@@ -347,8 +683,12 @@ class DocumentBrowser():
 
     def __init__(self):
         self.configuration = Configuration()
+        # antialiasing above level 2 is hardly visible on screen,
+        # but makes rendering slower
+        fitz.TOOLS.set_aa_level(self.configuration.get_option('aa_level', 2))
         # self.documents = [] # for future multiple documents app
-        self.views = [] # list of open views
+        self.views = deque() # open views, most recently added first
+        self._by_window = dict() # open views by id of their window
         self.view = None # active view
 
     def start(self, argv):
@@ -370,17 +710,23 @@ class DocumentBrowser():
         Add view to application.
         """
         self.view = view
-        self.views.insert(0, self.view)
+        self.views.appendleft(view)
+        self._by_window[id(view.form)] = view
+
+    def get_view(self, window):
+        """
+        Return view with given window or None.
+        """
+        return self._by_window.get(id(window))
 
     def set_active_view(self, window):
         # find view with this window
-        view = [x for x in self.views if x.form == window][0]
-        print
+        view = self.get_view(window)
         if isinstance(view, DocumentView):
             self.view = view
-            logging.info(f"Set active view: {view}")
+            logger.debug("Set active view: %s", view)
         else:
-            logging.warning(f"Wrong type of object: {view}")
+            logger.warning("No view for window: %s", window)
 
     def close(self, view):
         """
@@ -389,14 +735,15 @@ class DocumentBrowser():
         or exit application if last window closed and return `True`.
         """
         self.configuration.update_history(self.view.config_dictionary())
+        del self._by_window[id(self.view.form)]
         self.views.remove(self.view)
         self.view.close()
         if self.views:
             self.view = self.views[0]
-            logging.info(f"Close view, but it is not last.")
+            logger.info("Close view, but it is not last.")
             return False
         else:
-            logging.info(f"Close last view.")
+            logger.info("Close last view.")
             return True
 
     def close_all_views(self):
@@ -406,13 +753,14 @@ class DocumentBrowser():
         self.configuration.save_session(app)
         for view in self.views:
             view.close()
-        logging.info(f"Close all views.")
+        logger.info("Close all views.")
 
     def finalize(self):
         """
         End actions after exit from application event loop.
         """
-        logging.info(f"Close application.")
+        self.configuration.flush()
+        logger.info("Close application.")
     
 # ------------------------------------------------------------------------------
 # utilities and popups
@@ -448,10 +796,10 @@ def get_filename_from_history_GUI(app):
                                  [sg.OK(), sg.Cancel()]
                                 ])
     event, choice = window.read()
+    indexes = window['SELECTED'].get_indexes() if event == 'OK' else ()
     window.close()
-    if event == 'OK' and bool(choice['SELECTED']):
-        index = labels.index(choice['SELECTED'][0])
-        return values[index]
+    if indexes:
+        return values[indexes[0]]
     else:
         return None
 
@@ -484,52 +832,123 @@ def show_help_page_GUI():
 
 
 
-# define the events we want to handle
+# ------------------------------------------------------------------------------
+# Actions – handlers of events
+# ------------------------------------------------------------------------------
 
-def is_Quit(event):
-    return event == sg.WINDOW_CLOSE_ATTEMPTED_EVENT or event in ('key-q', 'key-SHIFT-Q', "key-CTRL-Q")
+# Action is called with application and window of the event,
+# and returns True when application should end.
 
-def is_QuitAll(event):
-    return event.startswith("Escape:")
-    
-def is_Next(event):
-    return event.startswith("Next") or event == "MouseWheel:Down" or event.startswith("Up:") or event.startswith("Right:")
+def do_Quit(app, window):
+    return app.close(window)
 
-def is_Prior(event):
-    return event.startswith("Prior") or event == "MouseWheel:Up" or event.startswith("Down:") or event.startswith("Left:")
+def do_QuitAll(app, window):
+    app.close_all_views()
+    return True
 
-def is_Goto(event):
-    return event in ('g', 'G')
-    
-def is_GotoFirstPage(event):
-    return event in ('key-Home',)
-    
-def is_Open(event):
-    return event in ('o', 'O')
+def do_FocusIn(app, window):
+    app.set_active_view(window)
+
+def do_Open(app, window):
+    fname = get_filename_from_open_GUI()
+    if fname:
+        app.configuration.update_history(app.view.config_dictionary())
+        view_history = app.configuration.get_view_history(fname)
+        if view_history:
+            app.add_view(DocumentView.from_config(view_history))
+        else:
+            app.add_view(DocumentView(fname, page_index=0))
+            app.view.center_window_on_screen()
+
+def do_OpenFromHistory(app, window):
+    view_history = get_filename_from_history_GUI(app)
+    app.configuration.update_history(app.view.config_dictionary())
+    if view_history and os.path.isfile(view_history['file_name']):
+        app.add_view(DocumentView.from_config(view_history))
 
-def is_OpenFromHistory(event):
-    return event in ('h', 'H')
+def do_ShowHelpPage(app, window):
+    show_help_page_GUI()
+
+# view actions (view is updated only when its state changes)
+
+def do_Rendered(app, window):
+    # page rendered in background is ready (view may be already closed)
+    view = app.get_view(window)
+    if view:
+        view.update()
+
+def do_Next(app, window):
+    app.view.next_page()
+    app.view.update()
+
+def do_Prior(app, window):
+    app.view.previous_page()
+    app.view.update()
+
+def do_Goto(app, window):
+    index = get_page_number_from_GUI()
+    if index:
+        app.view.go_to_page(index)
+        app.view.update()
+
+def do_GotoFirstPage(app, window):
+    app.view.go_to_page(0)
+    app.view.update()
 
-def is_ZoomIn(event):
-    return event in ('+', )
+def do_ZoomIn(app, window):
+    app.view.set_zoom(app.view.zoom * 1.25)
+    app.view.schedule_update()
 
-def is_ZoomOut(event):
-    return event in ('-', )
+def do_ZoomOut(app, window):
+    app.view.set_zoom(app.view.zoom / 1.25)
+    app.view.schedule_update()
 
-def is_ZoomFit(event):
-    return event in ('f', 'F', '*')
+def do_ZoomFit(app, window):
+    zoom = app.view.get_fit_zoom()
+    if abs(zoom - app.view.zoom) > 1e-6:
+        app.view.set_zoom(zoom)
+        app.view.update()
 
-def is_Zoom100(event):
-    return event in ('0',) 
+def do_Zoom100(app, window):
+    app.view.set_zoom(1.0)
+    app.view.update()
 
-def is_ToggleColorspace(event):
-    return event in ('c', 'C') 
+def do_ToggleColorspace(app, window):
+    app.view.toggle_colorspace()
+    app.view.update()
 
-def is_ShowHelpPage(event):
-    return event in ('key-F1', )
+# define the events we want to handle
 
-def is_FocusIn(event):
-    return event in ('FOCUS IN', )
+# actions of events matched by whole event name
+DISPATCH = {sg.WINDOW_CLOSE_ATTEMPTED_EVENT: do_Quit,
+            'key-q': do_Quit, 'key-SHIFT-Q': do_Quit, 'key-CTRL-Q': do_Quit,
+            'FOCUS IN': do_FocusIn,
+            'o': do_Open, 'O': do_Open,
+            'h': do_OpenFromHistory, 'H': do_OpenFromHistory,
+            'key-F1': do_ShowHelpPage,
+            'MouseWheel:Down': do_Next,
+            'MouseWheel:Up': do_Prior,
+            'g': do_Goto, 'G': do_Goto,
+            'key-Home': do_GotoFirstPage,
+            '+': do_ZoomIn,
+            '-': do_ZoomOut,
+            'f': do_ZoomFit, 'F': do_ZoomFit, '*': do_ZoomFit,
+            '0': do_Zoom100,
+            'c': do_ToggleColorspace, 'C': do_ToggleColorspace,
+            DocumentView.RENDERED_EVENT: do_Rendered,
+            }
+
+# actions of key events matched by key name before colon (e.g. "Next:117")
+PREFIX_DISPATCH = {'Escape': do_QuitAll,
+                   'Next': do_Next, 'Up': do_Next, 'Right': do_Next,
+                   'Prior': do_Prior, 'Down': do_Prior, 'Left': do_Prior,
+                   }
+
+def get_action(event):
+    """
+    Return action handling event or None.
+    """
+    return DISPATCH.get(event) or PREFIX_DISPATCH.get(str(event).partition(':')[0])
 
 # ------------------------------------------------------------------------------
 # Application life cycle
@@ -541,68 +960,20 @@ app.start(sys.argv)
 
 # main event loop
 
+# changed configuration is saved when no event came for SAVE_DELAY ms
+# (burst of changes, e.g. opening several files, is saved once)
+SAVE_DELAY = 500
+
 while True:
     # event, value = app.view.form.Read()
-    window, event, value = sg.read_all_windows()
-    logging.info(f"Event – event: {event}, value: {value}, window: {window}")
-
-    # application events
-
-    if is_Quit(event):
-        is_last = app.close(window)
-        if is_last:
-            break
-
-    if is_QuitAll(event):
-        app.close_all_views()
+    timeout = SAVE_DELAY if app.configuration.is_dirty() else None
+    window, event, value = sg.read_all_windows(timeout=timeout)
+    if event == sg.TIMEOUT_EVENT:
+        app.configuration.flush()
+        continue
+    logger.debug("Event – event: %s, value: %s, window: %s", event, value, window)
+    action = get_action(event)
+    if action and action(app, window):
         break
 
-    if is_FocusIn(event):
-        app.set_active_view(window)
-
-    if is_Open(event):
-        fname = get_filename_from_open_GUI()
-        if fname:
-            app.configuration.update_history(app.view.config_dictionary())
-            view_history = app.configuration.get_view_history(fname)
-            if view_history:
-                app.add_view(DocumentView.from_config(view_history))
-            else:
-                app.add_view(DocumentView(fname, page_index=0))
-                app.view.center_window_on_screen()
-    
-    if is_OpenFromHistory(event):
-        view_history = get_filename_from_history_GUI(app)
-        app.configuration.update_history(app.view.config_dictionary())
-        if view_history and os.path.isfile(view_history['file_name']):
-            app.add_view(DocumentView.from_config(view_history))
-
-    elif is_ShowHelpPage(event):
-        show_help_page_GUI()
-
-    # view events
-
-    elif is_Next(event):
-        app.view.next_page()
-    elif is_Prior(event):
-        app.view.previous_page()
-    elif is_Goto(event):
-        index = get_page_number_from_GUI()
-        if index:
-            app.view.go_to_page(index)
-    elif is_GotoFirstPage(event):
-        app.view.go_to_page(0)
-    elif is_ZoomIn(event):
-        app.view.zoom *= 1.25
-    elif is_ZoomOut(event):
-        app.view.zoom /= 1.25
-    elif is_ZoomFit(event):
-        app.view.zoom = app.view.get_fit_zoom()
-    elif is_Zoom100(event):
-        app.view.zoom = 1.0
-    elif is_ToggleColorspace(event):
-        app.view.toggle_colorspace()
-
-    app.view.update()
-
 app.finalize()
@@ -1,8 +1,15 @@
 
 import sys
 import json
+import atexit
+import shutil
 import os.path
 from pathlib import Path
+from collections import OrderedDict
+try:
+    import orjson # optional, faster (de)serialization of big configuration files
+except ImportError:
+    orjson = None
 from datetime import datetime
 
 # ------------------------------------------------------------------------------
@@ -10,7 +17,8 @@ from datetime import datetime
 # ------------------------------------------------------------------------------
 
 """
-Configuration is stored on disk in json format.
+Configuration is stored on disk in json format
+(read and written with orjson, if it is installed).
 Default file, „browse.config” is searched in directory
 where application is started.
 
@@ -18,6 +26,7 @@ Data structure is dictionary as follows:
 {
 "configuration": {} # optional, dictionary of configurable application
                     # parameters (for example keybindings, screen resolution etc.
+                    # "aa_level": 2 - antialiasing level of rendering, 0..8)
 "history": [ # list of documents opened in the past
             { # example record
               "file_name": "x:/full/path/to/document",
@@ -49,41 +58,100 @@ class Configuration:
         """
         self.path = Path(path)
         self._config = dict()
+        self._dirty = False # configuration changed since last save
+        self._last_written = None # data written by last save (or loaded)
+        # history entries by file name, most recent first
+        self._history = OrderedDict()
         if os.path.isfile(path):
-            with open(path, "r") as read_file:
-                self._config = json.load(read_file)
+            data = self.path.read_bytes()
+            self._config = orjson.loads(data) if orjson else json.loads(data)
+            for entry in self._config.get('history', []):
+                self._history.setdefault(entry['file_name'], entry)
+            self._last_written = self._serialize()
+        atexit.register(self.flush)
 
     def save(self, backup=False):
         """
-        Save all configuration data to disk.
+        Save all configuration data to disk (as compact json).
+        Data is written to temporary file which then replaces configuration
+        file, so interrupted save doesn't corrupt it. Nothing is written
+        if data didn't change since last save. With `backup` the previous
+        file is kept as dated copy (first one of the day).
         """
-        if backup:
-            timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-            p = self.path
-            p.rename(Path(p.parent, f"{p.stem}_{timestamp}{p.suffix}"))
-        with open(self.path, "w") as write_file:
-            json.dump(self._config, write_file, indent=2)
+        data = self._serialize()
+        if data != self._last_written:
+            tmp_path = Path(self.path.parent, self.path.name + ".tmp")
+            with open(tmp_path, "wb") as write_file:
+                write_file.write(data)
+                write_file.flush()
+                os.fsync(write_file.fileno())
+            if backup and self.path.is_file():
+                # at most one backup a day (copied, so configuration file
+                # exists even if save fails)
+                timestamp = datetime.now().strftime("%Y-%m-%d")
+                p = self.path
+                backup_path = Path(p.parent, f"{p.stem}_{timestamp}{p.suffix}")
+                if not backup_path.exists():
+                    shutil.copy2(p, backup_path)
+            os.replace(tmp_path, self.path)
+            self._last_written = data
+        # data are marked as saved only when save succeeded
+        # (failed save is retried by next flush)
+        self._dirty = False
+
+    def _serialize(self):
+        """
+        Return configuration data as compact json encoded bytes.
+        """
+        if self._history:
+            self._config['history'] = list(self._history.values())
+        if orjson:
+            return orjson.dumps(self._config)
+        return json.dumps(self._config, separators=(',', ':')).encode()
+
+    def flush(self):
+        """
+        Save configuration data if they changed since last save.
+        """
+        if self._dirty:
+            self.save()
+
+    def is_dirty(self):
+        """
+        Return True if configuration changed since last save.
+        """
+        return self._dirty
+
+    def get_option(self, name, default=None):
+        """
+        Return configurable application parameter (from "configuration").
+        """
+        return self._config.get('configuration', {}).get(name, default)
 
     def get_history(self):
-        if 'history' in self._config:
-            return self._config['history']
+        if self._history:
+            return list(self._history.values())
         else:
             return None
 
     def get_view_history(self, path):
-        if 'history' in self._config:
-            return next((x for x in self._config["history"] if x['file_name'] == path),
-                        None)        
+        return self._history.get(path)
+
+    def _put_history(self, view_dictionary):
+        """
+        Put view data on top of history, replacing older entry for the same file.
+        """
+        file_name = view_dictionary['file_name']
+        self._history[file_name] = view_dictionary
+        self._history.move_to_end(file_name, last=False)
 
     def update_history(self, view_dictionary):
-        if 'history' not in self._config:
-            self._config['history'] = [view_dictionary, ]
-        else:
-            history = self._config["history"]
-            history = [x for x in history if x['file_name'] != view_dictionary['file_name']]
-            history.insert(0, view_dictionary)
-            self._config["history"] = history
-        self.save()
+        if self._history:
+            head = next(iter(self._history.values()))
+            if head == view_dictionary:
+                return # nothing changed
+        self._put_history(view_dictionary)
+        self._dirty = True
 
     def get_session(self):
         if 'session' in self._config:
@@ -93,12 +161,6 @@ class Configuration:
 
     def save_session(self, app):
         self._config['session'] = [x.file_name for x in reversed(app.views)]
-        if 'history' not in self._config:
-            self._config['history'] = []
-        history = self._config["history"]
         for view in app.views:
-            data = view.config_dictionary()
-            history = [x for x in history if x['file_name'] != data['file_name']]
-            history.insert(0, data)
-        self._config["history"] = history
+            self._put_history(view.config_dictionary())
         self.save(backup=True)